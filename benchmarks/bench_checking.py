@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+"""
+Measure the cost of the per-call `checking` lookup made by contract
+wrappers, for both normal and coroutine functions.
+
+Each function is timed bare, with a contract while checking is enabled,
+and with the same contract while checking is disabled; the last figure
+minus the first is the overhead of the lookup itself.
+"""
+
+import asyncio
+import os
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dpcontracts import checking, require
+
+NUMBER = 100000
+
+def bare(x):
+    return x
+
+@require("`x` must be an integer", lambda args: isinstance(args.x, int))
+def contracted(x):
+    return x
+
+async def abare(x):
+    return x
+
+@require("`x` must be an integer", lambda args: isinstance(args.x, int))
+async def acontracted(x):
+    return x
+
+def drive(coroutine_function):
+    async def loop():
+        for i in range(NUMBER):
+            await coroutine_function(i)
+    event_loop = asyncio.new_event_loop()
+    return lambda: event_loop.run_until_complete(loop())
+
+def report(label, stmt):
+    seconds = min(repeat(stmt, number=1, repeat=5))
+    print("%-32s %10.1f ns/call" % (label, seconds / NUMBER * 1e9))
+
+def main():
+    report("sync, bare", lambda: [bare(i) for i in range(NUMBER)])
+    report("sync, checking on", lambda: [contracted(i) for i in range(NUMBER)])
+    with checking(False):
+        report("sync, checking off", lambda: [contracted(i) for i in range(NUMBER)])
+
+    report("coroutine, bare", drive(abare))
+    report("coroutine, checking on", drive(acontracted))
+    with checking(False):
+        report("coroutine, checking off", drive(acontracted))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+"""
+Report the throughput of contracted calls as the number of threads calling
+them grows from 1 to N (the number of CPUs by default, or the first
+command line argument).  On a free-threaded build of Python, throughput
+should grow with the thread count; on a build with the GIL, it should at
+least stay flat.
+
+Each configuration is run with contracts alone, with a latency budget on
+every contract, and while recording metrics to a shared file.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dpcontracts import Budget, ensure, invariant, record_metrics, require, set_budget
+
+CALLS = 20000
+
+@invariant("the total must not be negative", lambda self: self.total >= 0)
+class Account:
+    def __init__(self):
+        self.total = 0
+
+    @require("`amount` must be positive", lambda args: args.amount > 0)
+    @ensure("the total must have grown", lambda args, result: result >= args.amount)
+    def deposit(self, amount):
+        self.total += amount
+        return self.total
+
+def run(threads):
+    barrier = Barrier(threads)
+
+    def work(_):
+        account = Account()
+        barrier.wait()
+        for _ in range(CALLS):
+            account.deposit(1)
+
+    with ThreadPoolExecutor(threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(work, range(threads)))
+        return threads * CALLS / (time.perf_counter() - start)
+
+def report(label, maximum):
+    print(label)
+    for threads in range(1, maximum + 1):
+        print("  %3d threads %12.0f calls/s" % (threads, run(threads)))
+
+def main():
+    maximum = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 4)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("Python %s, GIL %s" % (sys.version.split()[0], "enabled" if gil else "disabled"))
+
+    report("contracts", maximum)
+
+    set_budget(Budget(1.0))
+    report("contracts with budgets", maximum)
+    set_budget(None)
+
+    with tempfile.TemporaryDirectory() as directory:
+        record_metrics(os.path.join(directory, "contracts.metrics"))
+        report("contracts recording metrics", maximum)
+        record_metrics(None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+"""
+Measure `transform` stacked on top of several contracts, against the same
+contracts without a transform and against the bare function.  The
+transformed arguments are bound once for the whole stack, so the cost of
+each further contract layer should be little more than its predicate.
+"""
+
+import os
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dpcontracts import ensure, require, rewrite, transform
+
+NUMBER = 100000
+
+def bare(l, scale=1, *rest, offset=0):
+    return sum(l) * scale + offset
+
+@require("`l` must not be empty", lambda args: len(args.l) > 0)
+@require("`scale` must be positive", lambda args: args.scale > 0)
+@require("`rest` must hold integers", lambda args: all(isinstance(x, int) for x in args.rest))
+@ensure("the result must be an integer", lambda args, result: isinstance(result, int))
+def contracted(l, scale=1, *rest, offset=0):
+    return sum(l) * scale + offset
+
+@transform(lambda args: rewrite(args, l=list(args.l)))
+@require("`l` must not be empty", lambda args: len(args.l) > 0)
+@require("`scale` must be positive", lambda args: args.scale > 0)
+@require("`rest` must hold integers", lambda args: all(isinstance(x, int) for x in args.rest))
+@ensure("the result must be an integer", lambda args, result: isinstance(result, int))
+def transformed(l, scale=1, *rest, offset=0):
+    return sum(l) * scale + offset
+
+def report(label, function):
+    data = (1, 2, 3)
+    stmt = lambda: [function(data, 2, 3, 4, offset=1) for _ in range(NUMBER)]
+    seconds = min(repeat(stmt, number=1, repeat=5))
+    print("%-40s %10.1f ns/call" % (label, seconds / NUMBER * 1e9))
+
+def main():
+    report("bare", bare)
+    report("4 contracts", contracted)
+    report("transform + 4 contracts", transformed)
+
+if __name__ == "__main__":
+    main()
@@ -427,6 +427,167 @@ This works for class methods too, of course:
     >>> TestClass().my_func(iota(5))
     10
 
+Transformed arguments are passed straight to the contracts below the
+`transform`, so they are bound only once however many contracts there
+are.  Functions taking variable positional arguments work too:
+
+    >>> @transform(lambda args: rewrite(args, items=tuple(list(x) for x in args.items)))
+    ... @require("every item must be nonempty", lambda args: all(args.items))
+    ... def total(*items):
+    ...     return sum(sum(x) for x in items)
+    >>> total(iota(3), iota(4))
+    9
+
+Element-wise Contracts
+======================
+Contracts over every element of a large collection, such as
+`all(x > 0 for x in args.l)`, run as Python loops and can easily take
+longer than the function they guard.  A set of helpers is provided for the
+most common element-wise checks: `all_positive`, `all_finite`, `no_nan`,
+`all_in_range`, `is_sorted`, `has_dtype`, and `has_shape`.  They run in
+vectorized form on NumPy arrays and on any object supporting the buffer
+protocol, and fall back to pure Python for lists and other iterables:
+
+    >>> import array
+    >>> @require("every item in `l` must be > 0", lambda args: all_positive(args.l))
+    ... @require("`l` must be sorted", lambda args: is_sorted(args.l))
+    ... @ensure("the result must be finite", lambda args, result: all_finite([result]))
+    ... def mean(l):
+    ...     return sum(l) / len(l)
+
+    >>> mean([1, 2, 3])
+    2.0
+    >>> mean(array.array("d", [0.5, 1.5, 2.5]))
+    1.5
+    >>> mean(array.array("d", [-0.5, 1.5])) # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    PreconditionError: every item in `l` must be > 0
+
+    >>> no_nan([1.0, float("nan")])
+    False
+    >>> all_in_range(array.array("i", [1, 5, 10]), 1, 10)
+    True
+    >>> has_shape([[1, 2, 3], [4, 5, 6]], (2, None))
+    True
+    >>> has_dtype(array.array("d", [1.0]), "d")
+    True
+
+NumPy is an optional dependency; without it, arrays and buffers are simply
+checked element by element.
+
+Quantifiers Over Large Collections
+==================================
+Contracts that test every element of a collection get slower as the
+collection grows.  For predicates where checking some of the elements is
+good enough, there are quantifier helpers that stay bounded in cost:
+`sampled_all` tests at most `k` elements, picked at random or at a fixed
+stride; `prefix_all` tests the first `k` elements; and `IncrementalAll`
+tests only the elements appended since the same sequence was last checked.
+They can be used in `require`, `ensure`, and `invariant` predicates alike:
+
+    >>> only_new_ints = IncrementalAll(lambda x: isinstance(x, int))
+    >>> @invariant("inner list must consist only of integers",
+    ...            lambda self: only_new_ints(self.lst))
+    ... class IntList:
+    ...     def __init__(self, initial):
+    ...         self.lst = list(initial)
+    ...
+    ...     @require("`values` must not contain None",
+    ...              lambda args: sampled_all(lambda x: x is not None, args.values, k=8))
+    ...     def extend(self, values):
+    ...         self.lst.extend(values)
+
+    >>> il = IntList(range(10000))
+    >>> il.extend([1, 2, 3])
+    >>> il.extend(["a"]) # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    PostconditionError: inner list must consist only of integers
+
+Each helper returns a `Quantified` result, which is true if the predicate
+held and which reports the sampling strategy used and how many elements
+were actually checked:
+
+    >>> sampled_all(lambda x: x >= 0, range(10000), k=10, strategy="stride")
+    Quantified(True, strategy='stride', checked=10)
+    >>> prefix_all(lambda x: x < 5, range(10000), k=5)
+    Quantified(True, strategy='prefix', checked=5)
+    >>> only_new_ints([1, 2, 3])
+    Quantified(True, strategy='incremental', checked=3)
+
+`IncrementalAll` remembers the last 128 sequences it checked (or `maxsize`).
+Sequences that support weak references are not kept alive by it, but plain
+lists are, until they are forgotten.
+
+Calling Contracted Functions in Batches
+=======================================
+Calling a contracted function over a large batch of inputs pays for
+argument binding and every contract on every call.  The `batch` function
+calls a contracted function once for each tuple of arguments in an
+iterable, using binding machinery prepared once for the whole batch, and
+lazily yields the results.  Preconditions and postconditions are still
+checked for every item:
+
+    >>> @require("`x` must be positive", lambda args: args.x > 0)
+    ... @ensure("the result must be greater than `x`", lambda args, result: result > args.x)
+    ... def double(x):
+    ...     return x * 2
+
+    >>> results = batch(double, [(1,), (2,), (3,)])
+    >>> list(results)
+    [2, 4, 6]
+
+Given a method of an object of a class with invariants, the invariants are
+checked once before the first call and once after the last one, rather
+than around every single call:
+
+    >>> @invariant("the total must not be negative", lambda self: self.total >= 0)
+    ... class Account:
+    ...     def __init__(self):
+    ...         self.total = 0
+    ...
+    ...     @require("`amount` must be positive", lambda args: args.amount > 0)
+    ...     def deposit(self, amount):
+    ...         self.total += amount
+    ...         return self.total
+
+    >>> account = Account()
+    >>> list(batch(account.deposit, [(10,), (20,), (30,)]))
+    [10, 30, 60]
+
+Collecting Contract Metrics Across Processes
+============================================
+Contract evaluation counts, violation counts, and timings can be recorded
+to a file that is mapped into memory and shared by every process using
+it, such as the pre-forked workers of a server.  Each thread of each
+process writes only to its own region of the file, without taking any
+locks, and `read_metrics` adds all the regions up.  By default a file
+has room for 256 recording threads (see `record_metrics`); metrics from
+threads beyond that are not recorded:
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "contracts.metrics")
+    >>> _ = record_metrics(path)
+
+    >>> @require("`x` must be positive", lambda args: args.x > 0)
+    ... def square(x):
+    ...     return x * x
+
+    >>> square(2)
+    4
+    >>> square(-2) # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    PreconditionError: `x` must be positive
+
+    >>> [(m.evaluations, m.violations) for label, m in read_metrics(path).items()
+    ...  if label.endswith("square: `x` must be positive")]
+    [(2, 1)]
+
+Metrics are reported as `ContractMetrics` tuples, keyed by a label naming
+the kind of contract, the function it is on, and its description.  Calling
+`record_metrics` with a path of None stops recording:
+
+    >>> _ = record_metrics(None)
+
 Contracts on Asynchronous Functions (aka coroutine functions)
 =============================================================
 Contracts can be placed on coroutines (that is, async functions):
@@ -457,6 +618,136 @@ influence the run loop:
     Traceback (most recent call last):
     AssertionError: contract predicates cannot be coroutines
 
+Contract Budgets
+================
+Some contracts become expensive as the data they check grows; an invariant
+that walks a list is cheap while the list is short, but can come to dominate
+the running time of a program later.  A latency budget, given by a `Budget`,
+can be placed on a contract.  A contract that exceeds its budget on several
+consecutive evaluations is demoted to sampled evaluation, where only some
+calls are checked, and is promoted back once it is cheap again:
+
+    >>> checked = []
+    >>> def expensive(args):
+    ...     checked.append(args.x)
+    ...     return True
+
+    >>> @require("`x` is acceptable", expensive,
+    ...          budget=Budget(1e-9, strikes=2, sample_every=3))
+    ... def identity(x):
+    ...     return x
+
+    >>> for i in range(8):
+    ...     _ = identity(i)
+    >>> checked
+    [0, 1, 4, 7]
+
+Every demotion and promotion is logged using the standard `logging` module,
+under the "dpcontracts" logger.
+
+The `require`, `ensure`, and `invariant` decorators all accept a `budget`.
+Contracts without a budget of their own use the global budget set using
+`set_budget`, if any:
+
+    >>> set_budget(Budget(0.001))
+    >>> set_budget(None)
+
+Finding and Changing Contracts at Runtime
+=========================================
+Every contract is recorded, as it is created, in an index that holds it
+only as long as the function or class it is on exists.  The `contracts`
+function looks contracts up by the qualified name of their function or
+class, by tag, or by kind:
+
+    >>> @require("`n` must be positive", lambda args: args.n > 0,
+    ...          tags=["canary"], cost="cheap")
+    ... @ensure("the result must be even", lambda args, result: result % 2 == 0)
+    ... def twice(n):
+    ...     return n * 2
+
+    >>> [contract.description for contract in contracts(qualname="twice")]
+    ['`n` must be positive', 'the result must be even']
+    >>> contract = contracts(tag="canary")[0]
+    >>> contract.kind, contract.cost
+    ('require', 'cheap')
+
+Each `Contract` also knows the function or class it is on, its description,
+its errno, and the source location of its predicate.  Its cost class is
+either declared using the `cost` argument of `require`, `ensure`, or
+`invariant`, or learned from timing the contract while a budget applies or
+metrics are being recorded.
+
+The predicate of a contract can be replaced, or the contract disabled
+altogether, without redefining the function it is on:
+
+    >>> contract.replace(lambda args: args.n > 10)
+    >>> twice(5) # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    PreconditionError: `n` must be positive
+
+    >>> contract.disable()
+    >>> twice(5)
+    10
+    >>> contract.enable()
+
+An invariant is a single contract, however many methods of its class it is
+checked around:
+
+    >>> @invariant("`count` must not be negative", lambda self: self.count >= 0)
+    ... class Tally:
+    ...     def __init__(self):
+    ...         self.count = 0
+    ...
+    ...     def add(self, n):
+    ...         self.count += n
+    ...
+    ...     def remove(self, n):
+    ...         self.count -= n
+
+    >>> [tally_invariant] = contracts(qualname="Tally", kind="invariant")
+    >>> tally_invariant.disable()
+    >>> Tally().remove(1)
+    >>> tally_invariant.enable()
+
+Looking contracts up and changing them does nothing to slow down calls to
+the functions they are on.
+
+Enabling and Disabling Contracts at Runtime
+===========================================
+Sometimes it is useful to run full contract checking for only part of a
+program; for example, a single canary request, while all other traffic runs
+with contracts turned off.  The `checking` object turns contract evaluation
+on or off for the current thread or asyncio task and everything it calls.
+It can be used as a context manager:
+
+    >>> @require("`x` must be positive", lambda args: args.x > 0)
+    ... def reciprocal(x):
+    ...     return 1 / x
+
+    >>> with checking(False):
+    ...     reciprocal(-2)
+    -0.5
+
+    >>> reciprocal(-2) # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    PreconditionError: `x` must be positive
+
+Or as a decorator, on both normal and coroutine functions:
+
+    >>> @checking(False)
+    ... async def handle_request(x):
+    ...     return reciprocal(x)
+
+    >>> asyncio.get_event_loop().run_until_complete(handle_request(-4))
+    -0.25
+
+Every contract wrapper consults this state with a single lookup, so code
+running with contracts turned off pays almost nothing for them.  The current
+state can be queried using `checking_enabled`:
+
+    >>> checking_enabled()
+    True
+
 Contracts and Debugging
 =======================
 Contracts are a documentation and testing tool; they are not intended
@@ -490,7 +781,12 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 __all__ = ["ensure", "invariant", "require", "transform", "rewrite",
-           "preserve", "PreconditionError", "PostconditionError"]
+           "preserve", "checking", "checking_enabled", "Budget", "set_budget",
+           "all_positive", "all_finite", "no_nan", "all_in_range", "is_sorted",
+           "has_dtype", "has_shape", "Quantified", "sampled_all", "prefix_all",
+           "IncrementalAll", "batch", "ContractMetrics", "record_metrics", "read_metrics",
+           "Contract", "contracts", "COST_CLASSES",
+           "PreconditionError", "PostconditionError"]
 __author__ = "Rob King"
 __copyright__ = "Copyright (C) 2015-2018 Rob King"
 __license__ = "LGPL"
@@ -499,15 +795,58 @@ __email__ = "jking@deadpixi.com"
 __status__ = "Alpha"
 
 from ast import parse
-from collections import namedtuple
-from functools import wraps
-from inspect import isfunction, ismethod, iscoroutinefunction, getfullargspec, getsource
-from sys import version_info
+from collections import namedtuple, OrderedDict
+from collections.abc import Sequence
+from dis import get_instructions
+from functools import lru_cache, wraps
+from itertools import islice
+from inspect import (isfunction, ismethod, iscoroutinefunction, isgeneratorfunction,
+                     isasyncgenfunction, getfullargspec, getsource, CO_VARARGS)
+from sys import byteorder, version_info
 from enum import IntEnum
+from logging import getLogger
+from math import isfinite, isnan
+from random import sample
+from threading import local, Lock
+import mmap
+import os
+from time import perf_counter
+from struct import calcsize, error as struct_error, pack, unpack
+from zlib import crc32
+from weakref import finalize, ref, WeakKeyDictionary, WeakSet
 
 if version_info[:2] < (3, 5):
     raise ImportError('dpcontracts >= 0.6 requires Python 3.5 or later.')
 
+try:
+    from fcntl import lockf, LOCK_EX, LOCK_UN
+except ImportError: # metrics files can be read, but not recorded to
+    lockf = None
+
+try:
+    import numpy
+except ImportError: # element-wise helpers fall back to pure Python
+    numpy = None
+
+try:
+    from contextvars import ContextVar
+except ImportError: # Python < 3.7; fall back to per-thread state
+    class ContextVar:
+        def __init__(self, name, default=None):
+            self._default = default
+            self._local = local()
+
+        def get(self):
+            return getattr(self._local, "value", self._default)
+
+        def set(self, value):
+            token = self.get()
+            self._local.value = value
+            return token
+
+        def reset(self, token):
+            self._local.value = token
+
 class PreconditionError(AssertionError):
     """An AssertionError raised due to violation of a precondition."""
 
@@ -529,9 +868,648 @@ class PostconditionError(AssertionError):
             return -1
 
 
+_checking = ContextVar("dpcontracts_checking", default=True)
+# The reset tokens of the `checking` blocks entered in the current context,
+# innermost last; shared by all instances so no ContextVar is made per block.
+_checking_tokens = ContextVar("dpcontracts_checking_tokens", default=())
+
+class checking:
+    """
+    Turn contract evaluation on or off for the current thread or asyncio
+    task and everything it calls, either as a context manager or as a
+    decorator.  Decorated generators and asynchronous generators have the
+    setting applied each time they are resumed, rather than only when they
+    are created.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = bool(enabled)
+
+    def __enter__(self):
+        _checking_tokens.set(_checking_tokens.get() + (_checking.set(self.enabled),))
+        return self
+
+    def __exit__(self, *exc_info):
+        tokens = _checking_tokens.get()
+        _checking.reset(tokens[-1])
+        _checking_tokens.set(tokens[:-1])
+        return False
+
+    def __call__(self, f):
+        enabled = self.enabled
+
+        if iscoroutinefunction(f):
+            @wraps(f)
+            async def inner(*args, **kwargs):
+                token = _checking.set(enabled)
+                try:
+                    return await f(*args, **kwargs)
+                finally:
+                    _checking.reset(token)
+
+        elif isgeneratorfunction(f):
+            @wraps(f)
+            def inner(*args, **kwargs):
+                return (yield from CheckingGenerator(f(*args, **kwargs), enabled))
+
+        elif isasyncgenfunction(f):
+            @wraps(f)
+            def inner(*args, **kwargs):
+                return CheckingAsyncGenerator(f(*args, **kwargs), enabled)
+
+        else:
+            @wraps(f)
+            def inner(*args, **kwargs):
+                token = _checking.set(enabled)
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    _checking.reset(token)
+
+        return inner
+
+class CheckingGenerator:
+    """
+    Drive `generator` with contract evaluation turned on or off, as given by
+    `enabled`, only while it runs; delegated to using `yield from`.
+    """
+
+    def __init__(self, generator, enabled):
+        self.generator = generator
+        self.enabled = enabled
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.step(self.generator.send, None)
+
+    def send(self, value):
+        return self.step(self.generator.send, value)
+
+    def throw(self, *exc_info):
+        return self.step(self.generator.throw, *exc_info)
+
+    def close(self):
+        return self.step(self.generator.close)
+
+    def step(self, method, *args):
+        token = _checking.set(self.enabled)
+        try:
+            return method(*args)
+        finally:
+            _checking.reset(token)
+
+class CheckingAsyncGenerator:
+    """The asynchronous counterpart of `CheckingGenerator`."""
+
+    def __init__(self, generator, enabled):
+        self.generator = generator
+        self.enabled = enabled
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self.step(self.generator.asend, None)
+
+    def asend(self, value):
+        return self.step(self.generator.asend, value)
+
+    def athrow(self, *exc_info):
+        return self.step(self.generator.athrow, *exc_info)
+
+    def aclose(self):
+        return self.step(self.generator.aclose)
+
+    async def step(self, method, *args):
+        # The task is suspended for as long as the generator runs, so the
+        # setting cannot leak into anything else it does.
+        token = _checking.set(self.enabled)
+        try:
+            return await method(*args)
+        finally:
+            _checking.reset(token)
+
+def checking_enabled():
+    """Return True if contracts are evaluated in the current context."""
+    return _checking.get()
+
+log = getLogger("dpcontracts")
+
+class Budget:
+    """
+    A per-process latency budget for a contract.  A contract whose predicate
+    takes longer than `seconds` on `strikes` consecutive evaluations is
+    demoted to sampled evaluation, in which only one call out of every
+    `sample_every` is checked.  A demoted contract is promoted back to full
+    evaluation once it has stayed within budget for `strikes` consecutive
+    sampled evaluations.
+    """
+
+    def __init__(self, seconds, strikes=3, sample_every=100):
+        assert seconds > 0, "budgets must be positive"
+        assert isint(strikes) and strikes > 0, "strikes must be a positive integer"
+        assert isint(sample_every) and sample_every > 0, "sample_every must be a positive integer"
+        self.seconds = seconds
+        self.strikes = strikes
+        self.sample_every = sample_every
+
+    def __repr__(self):
+        return "Budget(%r, strikes=%r, sample_every=%r)" % (self.seconds, self.strikes, self.sample_every)
+
+_default_budget = None
+
+def set_budget(budget):
+    """
+    Set the `Budget` used by every contract that was not given one of its
+    own, or turn budgets off for those contracts if `budget` is None.
+    """
+
+    global _default_budget
+    assert budget is None or isinstance(budget, Budget), "budgets must be Budget instances"
+    _default_budget = budget
+
+COST_CLASSES = ("cheap", "moderate", "expensive")
+
+def cost_class(seconds):
+    """Classify a predicate taking `seconds` to evaluate."""
+
+    if seconds < 1e-5:
+        return "cheap"
+    if seconds < 1e-3:
+        return "moderate"
+    return "expensive"
+
+def always_true(*args):
+    return True
+
+_contract_index = WeakSet()
+
+class Contract:
+    """
+    A single contract applied to a single function, or, for an invariant,
+    to every method of a class.  Every contract is kept
+    in a weakly referenced index, searchable using `contracts`, and its
+    predicate can be replaced or disabled at runtime.
+    """
+
+    # Contracts are shared by every thread calling the function they are on,
+    # so the counters driving budgets are kept per thread; only the (rarely
+    # changing) sampled flag is shared, and changing it takes a lock.
+
+    __slots__ = ("kind", "description", "predicate", "errno", "budget", "function",
+                 "tags", "declared_cost", "observed", "fields", "arity", "location",
+                 "plans", "suspended", "sampled", "counters", "transition", "slot",
+                 "__weakref__")
+
+    def __init__(self, kind, description, predicate, errno, budget, function,
+                 fields=None, cost=None, tags=()):
+        self.kind = kind
+        self.description = description
+        self.predicate = predicate
+        self.errno = errno
+        self.budget = budget
+        self.function = function # the class, for invariants
+        self.tags = frozenset(tags)
+        self.declared_cost = cost
+        self.observed = None
+        self.fields = fields
+        self.arity = arg_count(predicate)
+        # Where the contract was written, kept when its predicate is replaced.
+        code = predicate.__code__
+        self.location = (code.co_filename, code.co_firstlineno)
+        self.plans = WeakSet() # the binding plans of the layers binding for this contract
+        self.suspended = None # the predicate put aside while disabled
+        self.sampled = False
+        self.counters = local()
+        self.transition = Lock()
+        self.slot = None
+        _contract_index.add(self)
+
+    def __repr__(self):
+        return "<Contract %s %s: %r at %s>" % (self.kind, self.qualname, self.description,
+                                               self.source)
+
+    @property
+    def label(self):
+        return "%s %s.%s: %s" % (self.kind, self.function.__module__,
+                                 self.function.__qualname__, self.description)
+
+    @property
+    def qualname(self):
+        return self.function.__qualname__
+
+    @property
+    def source(self):
+        return "%s:%d" % self.location
+
+    @property
+    def cost(self):
+        """
+        The cost class of this contract: as declared when it was created, or
+        else as learned from timing it while a budget applies or metrics are
+        being recorded, or "unknown".
+        """
+
+        if self.declared_cost is not None:
+            return self.declared_cost
+        if self.observed is not None:
+            return cost_class(self.observed)
+        return "unknown"
+
+    @property
+    def enabled(self):
+        return self.suspended is None
+
+    def matches(self, qualname):
+        function = self.function
+        return qualname in (function.__qualname__,
+                            "%s.%s" % (function.__module__, function.__qualname__))
+
+    def replace(self, predicate):
+        """
+        Replace the predicate of this contract, taking effect from the next
+        call.  The new predicate must take the same arguments as the old one.
+        If it reads arguments the old one did not, the calls it checks bind
+        all of their arguments from then on.
+        """
+
+        assert isfunction(predicate), "contract predicates must be functions"
+        assert not iscoroutinefunction(predicate), "contract predicates cannot be coroutines"
+        assert arg_count(predicate) == self.arity, "replacement predicates must take %d arguments" % self.arity
+
+        if self.fields is not None and self.kind != "invariant":
+            fields = predicate_fields(predicate)
+            if fields is None or not fields <= self.fields:
+                for plan in list(self.plans):
+                    plan.widen()
+                self.fields = None
+
+        if self.suspended is not None:
+            self.suspended = predicate
+        else:
+            self.predicate = predicate
+
+    def disable(self):
+        """Stop checking this contract, until `enable` is called."""
+
+        if self.suspended is None:
+            self.suspended, self.predicate = self.predicate, always_true
+
+    def enable(self):
+        if self.suspended is not None:
+            self.predicate, self.suspended = self.suspended, None
+
+    def check(self, *args):
+        budget = self.budget or _default_budget
+        metrics = _metrics
+        if budget is None and metrics is None:
+            return self.predicate(*args)
+
+        if budget is not None and self.sampled:
+            counters = self.counters
+            counters.skipped = getattr(counters, "skipped", 0) + 1
+            if counters.skipped < budget.sample_every:
+                return True
+            counters.skipped = 0
+
+        start = perf_counter()
+        result = self.predicate(*args)
+        elapsed = perf_counter() - start
+
+        self.observe(elapsed)
+        if metrics is not None:
+            metrics.record(self, elapsed, result)
+        if budget is not None:
+            self.account(budget, elapsed)
+
+        return result
+
+    def observe(self, elapsed):
+        # Timings are gathered per thread and only occasionally published to
+        # the shared estimate, to keep threads from writing to it all the time.
+        counters = self.counters
+        timed = getattr(counters, "timed", 0) + 1
+        total = getattr(counters, "total", 0.0) + elapsed
+        counters.timed, counters.total = timed, total
+        if timed == 1 or timed % 64 == 0:
+            self.observed = total / timed
+
+    def account(self, budget, elapsed):
+        counters = self.counters
+        if elapsed > budget.seconds:
+            counters.under = 0
+            counters.over = getattr(counters, "over", 0) + 1
+            if not self.sampled and counters.over >= budget.strikes:
+                counters.over = 0
+                self.demote(budget)
+        else:
+            counters.over = 0
+            if self.sampled:
+                counters.under = getattr(counters, "under", 0) + 1
+                if counters.under >= budget.strikes:
+                    counters.under = 0
+                    self.promote(budget)
+
+    def demote(self, budget):
+        with self.transition:
+            if self.sampled:
+                return
+            self.sampled = True
+        log.warning("contract %r on %s exceeded its budget of %ss %d times in a row; "
+                    "demoted to sampled evaluation (1 in %d calls)", self.description,
+                    self.function.__qualname__, budget.seconds, budget.strikes,
+                    budget.sample_every)
+
+    def promote(self, budget):
+        with self.transition:
+            if not self.sampled:
+                return
+            self.sampled = False
+        log.info("contract %r on %s stayed within its budget of %ss %d times in a row; "
+                 "promoted to full evaluation", self.description,
+                 self.function.__qualname__, budget.seconds, budget.strikes)
+
+ContractMetrics = namedtuple("ContractMetrics", ("evaluations", "violations", "seconds"))
+
+class Metrics:
+    """
+    Per-contract evaluation counts, violation counts and timings, kept in a
+    file mapped into memory and shared by every process that opens it.
+
+    The file holds a table of contract labels and one region of counters for
+    each writing thread of each process.  A thread claims a free region (or
+    one whose process has exited) the first time it records anything, taking
+    a lock to do so; after that it only ever writes to its own region,
+    without locking, and releases the region when it exits.  Readers add the
+    regions up.  Once a file exists, its own `slots` and `regions` take
+    precedence over the ones given here.
+
+    The file stays mapped for as long as the object is referenced, such as
+    by threads still recording to it, so that it can be detached at any
+    time; only `close` it once nothing can be recording to it.
+    """
+
+    MAGIC = int.from_bytes(b"dpcmtrc1", "little")
+    LABEL_SIZE = 128
+    FIELDS = len(ContractMetrics._fields)
+
+    def __init__(self, path, slots=1024, regions=256, readonly=False):
+        if not readonly and lockf is None:
+            raise NotImplementedError("recording contract metrics needs POSIX file locks")
+
+        self.path = path
+        self.mutex = Lock() # file locks do not exclude threads of one process
+        self.fd = os.open(path, os.O_RDONLY if readonly else os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if not readonly:
+                with self.locked():
+                    if os.fstat(self.fd).st_size == 0:
+                        os.ftruncate(self.fd, self.size(slots, regions))
+                        os.lseek(self.fd, 0, os.SEEK_SET)
+                        os.write(self.fd, pack("=4Q", self.MAGIC, slots, regions, 0))
+
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            header = os.read(self.fd, 32)
+            if len(header) < 32 or unpack("=Q", header[:8])[0] != self.MAGIC:
+                raise ValueError("%s is not a contract metrics file" % path)
+            _, slots, regions, _ = unpack("=4Q", header)
+
+            self.map = mmap.mmap(self.fd, self.size(slots, regions),
+                                 access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+        except BaseException:
+            os.close(self.fd)
+            raise
+        self.release = finalize(self, os.close, self.fd)
+
+        self.slots = slots
+        self.regions = regions
+        view = memoryview(self.map)
+        labels_end = 32 + slots * self.LABEL_SIZE
+        owners_end = labels_end + regions * 8
+        self.labels = view[32:labels_end]
+        self.owners = view[labels_end:owners_end].cast("Q")
+        self.counters = view[owners_end:].cast("Q")
+        self.claimed = local()
+        self.key = object() # identifies the slots contracts cached for this file
+        self.generation = 0 # bumped on fork, invalidating inherited regions
+
+    @classmethod
+    def size(cls, slots, regions):
+        return 32 + slots * cls.LABEL_SIZE + regions * 8 + regions * slots * cls.FIELDS * 8
+
+    def locked(self):
+        return FileLock(self.fd, self.mutex)
+
+    def claim(self):
+        pid = os.getpid()
+        with self.locked():
+            for index in range(self.regions):
+                owner = self.owners[index]
+                if owner == 0 or not process_exists(owner):
+                    self.owners[index] = pid
+                    region = Region(self.owners, index, index * self.slots * self.FIELDS,
+                                    self.generation)
+                    break
+            else:
+                log.warning("no free region in contract metrics file %s; metrics from "
+                            "a thread of process %d will not be recorded", self.path, pid)
+                region = Region(self.owners, None, -1, self.generation)
+
+        self.claimed.region = region
+        return region
+
+    def slot(self, label):
+        """Return the index of the slot holding `label`, claiming it if need be."""
+
+        encoded = label.encode("utf-8")[:self.LABEL_SIZE - 1]
+        encoded = encoded + b"\0" * (self.LABEL_SIZE - len(encoded))
+        start = crc32(encoded) % self.slots
+        for probe in range(self.slots):
+            index = (start + probe) % self.slots
+            offset = index * self.LABEL_SIZE
+            current = self.labels[offset:offset + self.LABEL_SIZE]
+            if current == encoded:
+                return index
+            if current[0] == 0:
+                with self.locked():
+                    if self.labels[offset] == 0:
+                        self.labels[offset:offset + self.LABEL_SIZE] = encoded
+                if self.labels[offset:offset + self.LABEL_SIZE] == encoded:
+                    return index
+        return -1
+
+    def record(self, contract, elapsed, result):
+        region = getattr(self.claimed, "region", None)
+        if region is None or region.generation != self.generation:
+            region = self.claim()
+        base = region.base
+        if base < 0:
+            return
+
+        slot = contract.slot
+        if slot is None or slot[0] is not self.key:
+            slot = contract.slot = (self.key, self.slot(contract.label))
+        if slot[1] < 0:
+            return
+
+        index = base + slot[1] * self.FIELDS
+        counters = self.counters
+        counters[index] += 1
+        if not result:
+            counters[index + 1] += 1
+        counters[index + 2] += int(elapsed * 1e9)
+
+    def read(self):
+        """Return the merged `ContractMetrics` of every process, by contract label."""
+
+        totals = {}
+        stride = self.slots * self.FIELDS
+        for index in range(self.slots):
+            offset = index * self.LABEL_SIZE
+            raw = bytes(self.labels[offset:offset + self.LABEL_SIZE])
+            if raw[0] == 0:
+                continue
+
+            evaluations = violations = nanoseconds = 0
+            for region in range(self.regions):
+                at = region * stride + index * self.FIELDS
+                evaluations += self.counters[at]
+                violations += self.counters[at + 1]
+                nanoseconds += self.counters[at + 2]
+
+            label = raw.rstrip(b"\0").decode("utf-8", "replace")
+            previous = totals.get(label, ContractMetrics(0, 0, 0.0))
+            totals[label] = ContractMetrics(previous.evaluations + evaluations,
+                                            previous.violations + violations,
+                                            previous.seconds + nanoseconds / 1e9)
+        return totals
+
+    def close(self):
+        self.labels.release()
+        self.owners.release()
+        self.counters.release()
+        self.map.close()
+        self.release()
+
+class Region:
+    """
+    A region of a metrics file claimed by one thread, released when it exits
+    or the file is no longer recorded to.
+    """
+
+    def __init__(self, owners, index, base, generation):
+        self.owners = owners
+        self.index = index
+        self.base = base
+        self.generation = generation
+        self.pid = os.getpid()
+
+    def __del__(self):
+        # Counters are left in place, so that they still add up once the
+        # region has been claimed again.
+        if self.index is not None and self.pid == os.getpid():
+            try:
+                self.owners[self.index] = 0
+            except ValueError: # the metrics file has been closed
+                pass
+
+class FileLock:
+    """
+    An exclusive lock on an open file, and on `mutex` for the threads of this
+    process.
+    """
+
+    def __init__(self, fd, mutex):
+        self.fd = fd
+        self.mutex = mutex
+
+    def __enter__(self):
+        self.mutex.acquire()
+        try:
+            lockf(self.fd, LOCK_EX, 0, 0, os.SEEK_SET)
+        except BaseException:
+            self.mutex.release()
+            raise
+
+    def __exit__(self, *exc_info):
+        try:
+            lockf(self.fd, LOCK_UN, 0, 0, os.SEEK_SET)
+        finally:
+            self.mutex.release()
+        return False
+
+def process_exists(pid):
+    # Only used when recording, hence on POSIX, where signal 0 merely checks
+    # that the process exists (on Windows it would be CTRL_C_EVENT).
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError: # e.g. owned by another user
+        pass
+    return True
+
+_metrics = None
+
+def record_metrics(path, slots=1024, regions=256):
+    """
+    Start recording contract metrics to the shared file at `path`, creating
+    it if need be, and return the `Metrics` object; or stop recording them if
+    `path` is None.  Processes forked afterwards record to their own regions
+    of the same file.
+
+    Every recording thread of every process claims one of the file's
+    `regions` for as long as it runs.  Once they are all taken, further
+    threads record nothing, with just a warning logged for each of them, so
+    `regions` should be at least the number of threads that may record at
+    once, across all processes.  It is fixed when the file is created.
+
+    Recording needs POSIX file locks, and raises NotImplementedError on
+    platforms without them, such as Windows; metrics files can still be read
+    there.
+    """
+
+    global _metrics
+    # The previous file is detached rather than closed, as other threads may
+    # still be recording to it; it is unmapped once they are done with it.
+    _metrics = None
+    if path is not None:
+        _metrics = Metrics(path, slots, regions)
+    return _metrics
+
+def read_metrics(path):
+    """
+    Return the `ContractMetrics` recorded in the file at `path` by every
+    process, merged, in a dictionary keyed by contract label.
+    """
+
+    metrics = Metrics(path, readonly=True)
+    try:
+        return metrics.read()
+    finally:
+        metrics.close()
+
+def forget_region():
+    if _metrics is not None:
+        _metrics.generation += 1
+        _metrics.mutex = Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=forget_region)
+
 def get_function_source(func):
+    code = getattr(func, "__code__", None)
+    source = code_source(code.co_filename, code) if code is not None else None
+    return source if source is not None else str(func)
+
+@lru_cache(maxsize=1024)
+def code_source(filename, code):
+    # Code objects that compare equal may still come from different files,
+    # hence `filename` being part of the cache key.
     try:
-        source = getsource(func)
+        source = getsource(code)
         tree = parse(source)
         decorators = tree.body[0].decorator_list
         function = tree.body[0]
@@ -544,53 +1522,275 @@ def get_function_source(func):
         return "\n".join(source.split("\n")[first_line - 1:following_line - first_line]) + " failed"
 
     except (SyntaxError, OSError):
-        return str(func)
+        return None
 
 def get_wrapped_func(func):
     while hasattr(func, '__contract_wrapped_func__'):
         func = func.__contract_wrapped_func__
     return func
 
-def build_call(func, *args, **kwargs):
+MISSING = object()
+
+class Binder:
     """
-    Build an argument dictionary suitable for passing via `**` expansion given
-    function `f`, positional arguments `args`, and keyword arguments `kwargs`.
+    Bind the arguments of calls to `func` into `Args` records, either in full
+    or restricted to just the fields some set of contracts actually reads.
+    The function's parameters are analyzed once per code object, so that
+    functions made by a factory share the analysis; only their defaults are
+    read from each function.
     """
 
-    func = get_wrapped_func(func)
-    named, vargs, _, defs, kwonly, kwonlydefs, _ = getfullargspec(func)
+    def __init__(self, func):
+        code = getattr(func, "__code__", None)
+        if code is not None:
+            named, vargs, kwonly, positions = code_parameters(code)
+            defs, kwonlydefs = func.__defaults__, func.__kwdefaults__
+        else:
+            named, vargs, _, defs, kwonly, kwonlydefs, _ = getfullargspec(func)
+            named, kwonly = tuple(named), tuple(kwonly)
+            positions = dict((name, index) for index, name in enumerate(named))
+        self.name = func.__name__
+        self.named = named
+        self.vargs = vargs
+        self.kwonly = kwonly
+        self.positions = positions
+        self.defaults = dict(zip(reversed(named), reversed(defs or ())))
+        self.defaults.update(kwonlydefs or {})
+
+        # The layout build_call has always produced: the named arguments in
+        # order, then keyword-only arguments with defaults.
+        self.template = dict((name, MISSING) for name in named)
+        self.template.update(kwonlydefs or {})
+        self.template.update(self.defaults)
+
+    def missing(self, name):
+        return TypeError("%s missing required positional argument: '%s'" % (self.name, name))
+
+    def bind(self, args, kwargs):
+        actual = self.template.copy()
+        actual.update(zip(self.named, args))
+
+        if self.vargs:
+            actual[self.vargs] = tuple(args[len(self.named):])
+
+        actual.update(kwargs)
+
+        for name, value in actual.items():
+            if value is MISSING:
+                raise self.missing(name)
+
+        return record_type("Args", tuple(actual))(*actual.values())
+
+    def unbind(self, rargs):
+        """
+        Return the positional and keyword arguments with which to call the
+        function, given a full `Args` record for it.
+        """
+
+        kwargs = rargs._asdict()
+        args = []
+        for name in self.named:
+            if name not in kwargs:
+                break
+            args.append(kwargs.pop(name))
+        else:
+            if self.vargs:
+                args.extend(kwargs.pop(self.vargs, ()))
+        return args, kwargs
+
+    def binder(self, fields):
+        """
+        Return a function taking `(args, kwargs)` and returning a record of
+        just `fields`, or of every argument if `fields` is None or names
+        anything other than the function's own parameters.
+        """
+
+        if fields is None:
+            return self.bind
+
+        parameters = set(self.named) | set(self.kwonly) | set([self.vargs])
+        if not set(fields) <= parameters:
+            return self.bind
+
+        fields = tuple(sorted(fields))
+        record = record_type("Args", fields)
+        positions = self.positions
+        defaults = self.defaults
+        vargs = self.vargs
+        first_varg = len(self.named)
+
+        def bind(args, kwargs):
+            values = []
+            for name in fields:
+                if name in kwargs:
+                    values.append(kwargs[name])
+                    continue
+
+                index = positions.get(name)
+                if index is not None and index < len(args):
+                    values.append(args[index])
+                elif name == vargs:
+                    values.append(tuple(args[first_varg:]))
+                elif name in defaults:
+                    values.append(defaults[name])
+                else:
+                    raise self.missing(name)
+            return record(*values)
+
+        return bind
+
+@lru_cache(maxsize=1024)
+def code_parameters(code):
+    """
+    Return the named, variable positional, and keyword-only parameters of
+    `code`, along with the position of each named parameter.
+    """
 
-    nonce = object()
-    actual = dict((name, nonce) for name in named)
+    names = code.co_varnames
+    count = code.co_argcount
+    named = names[:count]
+    kwonly = names[count:count + code.co_kwonlyargcount]
+    vargs = names[count + len(kwonly)] if code.co_flags & CO_VARARGS else None
+    return named, vargs, kwonly, dict((name, index) for index, name in enumerate(named))
 
-    defs = defs or ()
-    kwonlydefs = kwonlydefs or {}
+binders = WeakKeyDictionary()
 
-    actual.update(kwonlydefs)
-    actual.update(dict(zip(reversed(named), reversed(defs))))
-    actual.update(dict(zip(named, args)))
+def get_binder(func):
+    try:
+        return binders[func]
+    except KeyError:
+        binder = binders[func] = Binder(func)
+        return binder
 
-    if vargs:
-        actual[vargs] = tuple(args[len(named):])
+def build_call(func, *args, **kwargs):
+    """
+    Build an argument dictionary suitable for passing via `**` expansion given
+    function `f`, positional arguments `args`, and keyword arguments `kwargs`.
+    """
 
-    actual.update(kwargs)
+    return get_binder(get_wrapped_func(func)).bind(args, kwargs)
 
-    for name, value in actual.items():
-        if value is nonce:
-            raise TypeError("%s missing required positional argument: '%s'" % (func.__name__, name))
+record_types = {}
 
-    return tuple_of_dict(actual)
+def record_type(name, fields):
+    # A plain dict rather than lru_cache: lookups happen on every call and
+    # must not contend on a lock.  Racing threads at worst build a type twice.
+    key = (name, fields)
+    try:
+        return record_types[key]
+    except KeyError:
+        if len(record_types) >= 1024:
+            record_types.clear()
+        return record_types.setdefault(key, namedtuple(name, fields))
 
 def tuple_of_dict(dictionary, name="Args"):
     assert isinstance(dictionary, dict), "dictionary must be a dict instance"
-    return namedtuple(name, dictionary.keys())(**dictionary)
+    return record_type(name, tuple(dictionary))(**dictionary)
 
 def arg_count(func):
-    named, vargs, _, defs, kwonly, kwonlydefs, _ = getfullargspec(func)
-    return len(named) + len(kwonly) + (1 if vargs else 0)
+    code = func.__code__
+    return code.co_argcount + code.co_kwonlyargcount + (1 if code.co_flags & CO_VARARGS else 0)
+
+def predicate_fields(predicate):
+    """
+    Return the set of attributes `predicate` reads from its first argument,
+    or None if it uses that argument in any other way.
+    """
+
+    try:
+        return frozenset(predicate.__contract_fields__)
+    except AttributeError:
+        return code_fields(predicate.__code__)
+
+@lru_cache(maxsize=1024)
+def code_fields(code):
+    if code.co_argcount == 0:
+        return None
+
+    name = code.co_varnames[0]
+    if name in code.co_cellvars: # captured by a nested function or generator
+        return None
+
+    fields = set()
+    instructions = list(get_instructions(code))
+    for index, instruction in enumerate(instructions):
+        if "FAST" not in instruction.opname:
+            continue
+
+        names = instruction.argval if isinstance(instruction.argval, tuple) else (instruction.argval,)
+        if name not in names:
+            continue
+
+        following = instructions[index + 1] if index + 1 < len(instructions) else None
+        if (instruction.opname not in ("LOAD_FAST", "LOAD_FAST_CHECK", "LOAD_FAST_BORROW")
+                or following is None
+                or following.opname not in ("LOAD_ATTR", "LOAD_METHOD")
+                or following.argval.startswith("_")):
+            return None
+        fields.add(following.argval)
+
+    return frozenset(fields)
+
+def union_fields(a, b):
+    return None if a is None or b is None else a | b
+
+# Kept apart from the layers themselves, which would otherwise reference
+# themselves and only be freed by the cycle collector.
+bound_entries = WeakKeyDictionary()
+layer_contracts = WeakKeyDictionary()
+
+def bound_entry(f):
+    """
+    Return the function implementing the contract layer `f` on already-bound
+    arguments, along with the fields it needs bound and the contracts it and
+    the layers below it implement, or None if `f` is not a contract layer.
+    """
+
+    try:
+        return bound_entries.get(f)
+    except TypeError: # not weakly referenceable, so not a contract layer
+        return None
+
+def layer_contract(f):
+    """Return the `Contract` implemented by the contract layer `f`, if any."""
+
+    try:
+        return layer_contracts.get(f)
+    except TypeError:
+        return None
+
+class Plan:
+    """
+    How a contract layer binds the arguments of the calls made to it.  It is
+    widened to full binding if a contract it binds for has its predicate
+    replaced by one reading more arguments.
+    """
+
+    __slots__ = ("binder", "bind", "__weakref__")
+
+    def __init__(self, binder, fields):
+        self.binder = binder
+        self.bind = binder.binder(fields)
+
+    def widen(self):
+        self.bind = self.binder.bind
+
+def contracts(qualname=None, tag=None, kind=None):
+    """
+    Return every live contract on a function or class named `qualname`
+    (optionally qualified by its module), tagged with `tag`, and of the kind
+    `kind` ("require", "ensure", or "invariant"), ordered by the location of
+    their predicates.  Criteria left as None match every contract.
+    """
+
+    return sorted((contract for contract in list(_contract_index)
+                   if (qualname is None or contract.matches(qualname))
+                   and (tag is None or tag in contract.tags)
+                   and (kind is None or contract.kind == kind)),
+                  key=lambda contract: contract.location)
 
 def condition(description, predicate, precondition=False, postcondition=False, instance=False,
-        errno=0, clean_up=None):
+        errno=0, clean_up=None, budget=None, cost=None, tags=(), contract=None):
     assert isinstance(description, str), "contract descriptions must be strings"
     assert len(description) > 0, "contracts must have nonempty descriptions"
     assert isfunction(predicate), "contract predicates must be functions"
@@ -600,25 +1800,62 @@ def condition(description, predicate, precondition=False, postcondition=False, i
         assert arg_count(predicate) == 1, "invariant predicates must take one argument"
     elif postcondition:
         assert arg_count(predicate) in (2, 3), "postcondition predicates must take two or three arguments"
+    assert budget is None or isinstance(budget, Budget), "budgets must be Budget instances"
+    assert cost is None or cost in COST_CLASSES, "contract costs must be one of %s" % (COST_CLASSES,)
+    assert not isinstance(tags, str), "contract tags must be a collection of strings"
+
+    takes_old = postcondition and not instance and arg_count(predicate) == 3
+    kind = "invariant" if instance else "require" if precondition else "ensure"
+
+    # Preservers are not known yet, and may read any argument.
+    if instance:
+        fields = frozenset()
+    else:
+        fields = None if takes_old else predicate_fields(predicate)
+
+    # `contract` is given to share one contract between several layers, as
+    # the layers on the methods of a class with an invariant do.
+    shared = contract
 
     def require(f):
         wrapped = get_wrapped_func(f)
+        contract = shared or Contract(kind, description, predicate, errno, budget, wrapped,
+                                      fields=fields, cost=cost, tags=tags)
+        evaluate = contract.check
+        next_bound, needs, below = bound_entry(f) or (None, fields, ())
+        needs = union_fields(fields, needs)
+        below = (contract,) + below
+
+        plan = None
+        if not instance or next_bound is not None:
+            plan = Plan(get_binder(wrapped), needs)
+            for other in below:
+                other.plans.add(plan)
+
+        # `bound` implements the contract given arguments that have already
+        # been bound by an outer layer (or by `inner`, below), and passes them
+        # on to the next layer down without binding them again.  It is only
+        # ever called with checking enabled.
 
         if iscoroutinefunction(f):
-            @wraps(f)
-            async def inner(*args, **kwargs):
-                rargs = build_call(f, *args, **kwargs) if not instance else args[0]
+            async def bound(rargs, args, kwargs):
+                subject = args[0] if instance else rargs
 
-                if precondition and not predicate(rargs):
+                if precondition and not evaluate(subject):
                     raise PreconditionError(description, errno)
 
-                preserved_values = {}
-                for preserver in getattr(wrapped, "__contract_preserver__", [lambda x: {}]):
-                    preserved_values.update(preserver(rargs))
-                result = await f(*args, **kwargs)
+                if takes_old:
+                    preserved_values = {}
+                    for preserver in getattr(wrapped, "__contract_preserver__", ()):
+                        preserved_values.update(preserver(rargs))
+
+                if next_bound is not None:
+                    result = await next_bound(rargs, args, kwargs)
+                else:
+                    result = await f(*args, **kwargs)
 
                 if instance:
-                    if not predicate(rargs):
+                    if not evaluate(subject):
                         if clean_up:
                             try:
                                 clean_up(*args, **kwargs)
@@ -627,10 +1864,10 @@ def condition(description, predicate, precondition=False, postcondition=False, i
                         raise PostconditionError(description, errno)
                 elif postcondition:
                     check = None
-                    if arg_count(predicate) == 3:
-                        check = predicate(rargs, result, tuple_of_dict(preserved_values))
+                    if takes_old:
+                        check = evaluate(rargs, result, tuple_of_dict(preserved_values))
                     else:
-                        check = predicate(rargs, result)
+                        check = evaluate(rargs, result)
                     if not check:
                         if clean_up:
                             try:
@@ -641,21 +1878,32 @@ def condition(description, predicate, precondition=False, postcondition=False, i
 
                 return result
 
-        elif isfunction(f):
             @wraps(f)
-            def inner(*args, **kwargs):
-                rargs = build_call(f, *args, **kwargs) if not instance else args[0]
+            async def inner(*args, **kwargs):
+                if not _checking.get():
+                    return await f(*args, **kwargs)
+
+                return await bound(plan.bind(args, kwargs) if plan else None, args, kwargs)
+
+        elif isfunction(f):
+            def bound(rargs, args, kwargs):
+                subject = args[0] if instance else rargs
 
-                if precondition and not predicate(rargs):
+                if precondition and not evaluate(subject):
                     raise PreconditionError(description, errno)
 
-                preserved_values = {}
-                for preserver in getattr(wrapped, "__contract_preserver__", [lambda x: {}]):
-                    preserved_values.update(preserver(rargs))
-                result = f(*args, **kwargs)
+                if takes_old:
+                    preserved_values = {}
+                    for preserver in getattr(wrapped, "__contract_preserver__", ()):
+                        preserved_values.update(preserver(rargs))
+
+                if next_bound is not None:
+                    result = next_bound(rargs, args, kwargs)
+                else:
+                    result = f(*args, **kwargs)
 
                 if instance:
-                    if not predicate(rargs):
+                    if not evaluate(subject):
                         if clean_up:
                             try:
                                 clean_up(*args, **kwargs)
@@ -664,10 +1912,10 @@ def condition(description, predicate, precondition=False, postcondition=False, i
                         raise PostconditionError(description, errno)
                 elif postcondition:
                     check = None
-                    if arg_count(predicate) == 3:
-                        check = predicate(rargs, result, tuple_of_dict(preserved_values))
+                    if takes_old:
+                        check = evaluate(rargs, result, tuple_of_dict(preserved_values))
                     else:
-                        check = predicate(rargs, result)
+                        check = evaluate(rargs, result)
                     if not check:
                         if clean_up:
                             try:
@@ -678,17 +1926,28 @@ def condition(description, predicate, precondition=False, postcondition=False, i
 
                 return result
 
+            @wraps(f)
+            def inner(*args, **kwargs):
+                if not _checking.get():
+                    return f(*args, **kwargs)
+
+                return bound(plan.bind(args, kwargs) if plan else None, args, kwargs)
+
         else:
             raise NotImplementedError
 
         inner.__contract_wrapped_func__ = wrapped
+        bound_entries[inner] = (bound, needs, below)
+        layer_contracts[inner] = contract
         return inner
     return require
 
-def require(arg1, arg2=None, arg3=None):
+def require(arg1, arg2=None, arg3=None, budget=None, cost=None, tags=()):
     """
     Specify a precondition described by `description` and tested by
-    `predicate`, raising an error `errno` on failure.
+    `predicate`, raising an error `errno` on failure.  If `budget` is
+    given, it overrides the global latency budget for this contract; `cost`
+    declares its cost class and `tags` lists tags to find it by.
     """
 
     assert any([
@@ -711,7 +1970,8 @@ def require(arg1, arg2=None, arg3=None):
         predicate = arg1
         errno = errno or arg2
 
-    return condition(description, predicate, True, False, errno=errno)
+    return condition(description, predicate, True, False, errno=errno, budget=budget,
+                     cost=cost, tags=tags)
 
 def rewrite(args, **kwargs):
     return args._replace(**kwargs)
@@ -725,24 +1985,126 @@ def preserve(preserver):
         @wraps(f)
         def inner(*args, **kwargs):
             return f(*args, **kwargs)
-        if not hasattr(wrapped, "__contract_preserver__"):
-            wrapped.__contract_preserver__ = []
-        wrapped.__contract_preserver__.append(preserver)
+        inner.__contract_wrapped_func__ = wrapped
+        following = bound_entry(f)
+        if following is not None:
+            bound_entries[inner] = following
+        # Each preserve layer owns its preserver, which is dropped from the
+        # wrapped function again when the layer is collected, so decorating
+        # the same function again (e.g. in a factory) does not pile them up.
+        with preservers_lock:
+            wrapped.__contract_preserver__ = \
+                getattr(wrapped, "__contract_preserver__", ()) + (preserver,)
+        finalize(inner, forget_preserver, wrapped, preserver)
         return inner
     return func
+
+preservers_lock = Lock()
+
+def forget_preserver(wrapped, preserver):
+    # The tuple is replaced rather than mutated, so that calls iterating over
+    # it from other threads are unaffected.
+    with preservers_lock:
+        preservers = list(wrapped.__contract_preserver__)
+        del preservers[next(i for i, p in enumerate(preservers) if p is preserver)]
+        wrapped.__contract_preserver__ = tuple(preservers)
             
 def transform(transformer):
     assert isfunction(transformer), "transformers must be functions"
     assert arg_count(transformer) == 1, "transformers can only take a single argument"
 
     def func(f):
+        wrapped = get_wrapped_func(f)
+        binder = get_binder(wrapped)
+        next_bound = (bound_entry(f) or (None,))[0]
+
+        # The transformed arguments are handed straight to the contract
+        # layers below, which then need not bind them again.
+        def bound(rargs, args, kwargs):
+            rargs = transformer(rargs)
+            args, kwargs = binder.unbind(rargs)
+            if next_bound is not None:
+                return next_bound(rargs, args, kwargs)
+            return f(*args, **kwargs)
+
         @wraps(f)
         def inner(*args, **kwargs):
-            rargs = transformer(build_call(f, *args, **kwargs))
-            return f(**(rargs._asdict()))
+            if not _checking.get():
+                return f(*args, **kwargs)
+
+            return bound(binder.bind(args, kwargs), args, kwargs)
+
+        inner.__contract_wrapped_func__ = wrapped
+        bound_entries[inner] = (bound, None, ())
         return inner
     return func
 
+def batch(func, arguments):
+    """
+    Call the contracted function `func` once for each tuple of positional
+    arguments in `arguments`, lazily yielding the results.  Arguments are
+    bound and checked against preconditions and postconditions for every
+    item, using binding machinery prepared once for the whole batch.  If
+    `func` is a method bound to an instance of a class with invariants,
+    those invariants are checked once before the first call and once after
+    the last, rather than around every call.
+    """
+
+    instance = None
+    layer = func
+    if ismethod(func):
+        instance = func.__self__
+        layer = func.__func__
+
+    invariants = []
+    while instance is not None:
+        contract = layer_contract(layer)
+        if contract is None or contract.kind != "invariant":
+            break
+        invariants.append(contract)
+        layer = layer.__wrapped__
+
+    assert not iscoroutinefunction(layer), "batch does not support coroutine functions"
+
+    entry = bound_entry(layer)
+    bound, plan = None, None
+    if entry is not None:
+        bound, needs, below = entry
+        plan = Plan(get_binder(get_wrapped_func(layer)), needs)
+        for contract in below:
+            contract.plans.add(plan)
+    prefix = (instance,) if instance is not None else ()
+    no_kwargs = {}
+
+    def calls():
+        if not _checking.get():
+            for item in arguments:
+                yield layer(*(prefix + tuple(item)))
+            return
+
+        for contract in invariants:
+            if not contract.check(instance):
+                raise PreconditionError(contract.description, contract.errno)
+
+        def check_invariants():
+            for contract in reversed(invariants):
+                if not contract.check(instance):
+                    raise PostconditionError(contract.description, contract.errno)
+
+        try:
+            for item in arguments:
+                args = prefix + tuple(item)
+                if bound is None:
+                    yield layer(*args)
+                else:
+                    yield bound(plan.bind(args, no_kwargs), args, no_kwargs)
+        except GeneratorExit:
+            check_invariants()
+            raise
+        check_invariants()
+
+    return calls()
+
 def types(**requirements):
     """
     Specify a precondition based on the types of the function's
@@ -761,12 +2123,16 @@ def types(**requirements):
 
         return True
 
+    predicate.__contract_fields__ = frozenset(requirements)
+
     return condition("the types of arguments must be valid", predicate, True)
 
-def ensure(arg1, arg2=None, arg3=None, arg4=None):
+def ensure(arg1, arg2=None, arg3=None, arg4=None, budget=None, cost=None, tags=()):
     """
     Specify a precondition described by `description` and tested by
     `predicate`, raising an error with `errno` and calling `clean_up` on failure.
+    If `budget` is given, it overrides the global latency budget for this
+    contract; `cost` declares its cost class and `tags` lists tags to find it by.
     """
 
     assert any([
@@ -808,12 +2174,15 @@ def ensure(arg1, arg2=None, arg3=None, arg4=None):
             errno = arg2 or errno
             clean_up = arg3 or clean_up
 
-    return condition(description, predicate, False, True, errno=errno, clean_up=clean_up)
+    return condition(description, predicate, False, True, errno=errno, clean_up=clean_up,
+                     budget=budget, cost=cost, tags=tags)
 
-def invariant(arg1, arg2=None):
+def invariant(arg1, arg2=None, budget=None, cost=None, tags=()):
     """
     Specify a class invariant described by `description` and tested
-    by `predicate`.
+    by `predicate`.  If `budget` is given, it overrides the global latency
+    budget for this contract; `cost` declares its cost class and `tags` lists
+    tags to find it by.
     """
 
     desc = ""
@@ -845,28 +2214,339 @@ def invariant(arg1, arg2=None):
         class InvariantContractor(c):
             pass
 
+        # A single contract, made along with the first layer, is shared by the
+        # layers on every method.
+        contract = None
         for name, value in [(name, getattr(c, name)) for name in dir(c)]:
             if check(name, value):
-                setattr(InvariantContractor, name,
-                        condition(desc, predicate, name != "__init__", True, True)(value))
+                layer = condition(desc, predicate, name != "__init__", True, True,
+                                  budget=budget, cost=cost, tags=tags, contract=contract)(value)
+                if contract is None:
+                    contract = layer_contract(layer)
+                    contract.function = c
+                setattr(InvariantContractor, name, layer)
         return InvariantContractor
     return invariant
 
 def isint(value):
     return isinstance(value, int) or isinstance(value, IntEnum)
 
+def as_array(values):
+    """
+    Return `values` as a NumPy array if it is one already or if it supports
+    the buffer protocol and NumPy is available, or None otherwise.
+    """
+
+    if numpy is None:
+        return None
+
+    if isinstance(values, numpy.ndarray):
+        return values
+
+    try:
+        return numpy.asarray(memoryview(values))
+    except (TypeError, ValueError):
+        return None
+
+def elements(values):
+    """
+    Return an iterable over the individual elements of `values`, flattening
+    arrays and buffers.
+    """
+
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return values.ravel().tolist()
+
+    try:
+        view = memoryview(values)
+    except TypeError:
+        return values
+
+    try:
+        return view.cast("B").cast(native_format(view.format)).tolist()
+    except (NotImplementedError, TypeError, ValueError): # e.g. structs or foreign byte order
+        return values
+
+def native_format(format):
+    """
+    Return the `struct` format `format` without its byte order prefix, if
+    that prefix describes the native byte order and sizes anyway, as the
+    formats of ctypes buffers (such as "<d") often do.
+    """
+
+    prefix, native = format[:1], format[1:]
+    if prefix == "@":
+        return native
+    if prefix not in ("<", ">", "!", "="):
+        return format
+
+    order = byteorder if prefix == "=" else "little" if prefix == "<" else "big"
+    try:
+        if order == byteorder and calcsize(format) == calcsize(native):
+            return native
+    except struct_error:
+        pass
+    return format
+
+def vectorized(values, vector, scalar):
+    array = as_array(values)
+    if array is not None:
+        try:
+            return bool(vector(array))
+        except TypeError: # e.g. object arrays
+            pass
+    return scalar(elements(values))
+
+def all_positive(values):
+    """Return True if every element of `values` is greater than zero."""
+    return vectorized(values, lambda a: (a > 0).all(),
+                      lambda e: all(x > 0 for x in e))
+
+def all_finite(values):
+    """Return True if no element of `values` is infinite or NaN."""
+    return vectorized(values, lambda a: numpy.isfinite(a).all(),
+                      lambda e: all(isfinite(x) for x in e))
+
+def no_nan(values):
+    """Return True if no element of `values` is NaN."""
+    return vectorized(values, lambda a: not numpy.isnan(a).any(),
+                      lambda e: not any(isnan(x) for x in e))
+
+def all_in_range(values, low, high):
+    """Return True if every element of `values` is between `low` and `high`, inclusive."""
+    return vectorized(values, lambda a: ((a >= low) & (a <= high)).all(),
+                      lambda e: all(low <= x <= high for x in e))
+
+def is_sorted(values):
+    """Return True if the elements of `values` are in non-decreasing order."""
+
+    def scalar(e):
+        e = list(e)
+        return all(a <= b for a, b in zip(e, e[1:]))
+
+    return vectorized(values, lambda a: (a.ravel()[:-1] <= a.ravel()[1:]).all(), scalar)
+
+def has_dtype(values, dtype):
+    """
+    Return True if the elements of `values` are of type `dtype`.  For arrays
+    and buffers, `dtype` is anything NumPy accepts as a dtype (or a `struct`
+    format string, if NumPy is not available, compared after dropping any
+    byte order prefix that means the native one); for other iterables, it
+    is a type or tuple of types every element must be an instance of.
+    """
+
+    array = as_array(values)
+    if array is not None:
+        return array.dtype == numpy.dtype(dtype)
+
+    try:
+        return native_format(memoryview(values).format) == native_format(dtype)
+    except TypeError:
+        return all(isinstance(x, dtype) for x in values)
+
+def has_shape(values, shape):
+    """
+    Return True if `values` has the shape `shape`, where a `None` in `shape`
+    matches any length along that axis.  The shape of nested lists and tuples
+    is taken from their first elements.
+    """
+
+    array = as_array(values)
+    if array is not None:
+        actual = array.shape
+    else:
+        try:
+            actual = memoryview(values).shape
+        except TypeError:
+            actual = ()
+            while isinstance(values, (list, tuple)):
+                actual += (len(values),)
+                values = values[0] if values else None
+
+    return len(actual) == len(shape) and all(want is None or want == got
+                                              for want, got in zip(shape, actual))
+
+class Quantified:
+    """
+    The result of a quantifier helper: true if the predicate held for every
+    element that was checked.  `strategy` names the way elements were
+    chosen and `checked` is how many of them were tested.
+    """
+
+    __slots__ = ("holds", "strategy", "checked")
+
+    def __init__(self, holds, strategy, checked):
+        self.holds = holds
+        self.strategy = strategy
+        self.checked = checked
+
+    def __bool__(self):
+        return self.holds
+
+    def __repr__(self):
+        return "Quantified(%r, strategy=%r, checked=%r)" % (self.holds, self.strategy, self.checked)
+
+def quantify(predicate, chosen, strategy):
+    checked = 0
+    for value in chosen:
+        checked += 1
+        if not predicate(value):
+            return Quantified(False, strategy, checked)
+    return Quantified(True, strategy, checked)
+
+def sampled_all(predicate, values, k=32, strategy="random"):
+    """
+    Test `predicate` against at most `k` elements of the sequence `values`,
+    chosen either at random (`strategy="random"`) or at a fixed stride
+    (`strategy="stride"`).  Collections of no more than `k` elements are
+    checked exhaustively; other iterables that cannot be indexed, such as
+    sets, dictionaries and generators, are checked using `prefix_all`.
+    """
+
+    assert strategy in ("random", "stride"), "strategy must be 'random' or 'stride'"
+    assert isint(k) and k > 0, "k must be a positive integer"
+
+    try:
+        n = len(values)
+    except TypeError:
+        return prefix_all(predicate, values, k)
+
+    if n <= k:
+        return quantify(predicate, values, "exhaustive")
+
+    if not is_indexable(values):
+        return prefix_all(predicate, values, k)
+
+    if strategy == "random":
+        indexes = sample(range(n), k)
+    else:
+        indexes = range(0, n, -(-n // k))
+    return quantify(predicate, (values[i] for i in indexes), strategy)
+
+def is_indexable(values):
+    return isinstance(values, Sequence) or (numpy is not None
+                                            and isinstance(values, numpy.ndarray))
+
+def prefix_all(predicate, values, k=32):
+    """Test `predicate` against the first `k` elements of the iterable `values`."""
+
+    assert isint(k) and k > 0, "k must be a positive integer"
+    return quantify(predicate, islice(values, k), "prefix")
+
+class IncrementalAll:
+    """
+    A quantifier that tests `predicate` only against the elements appended to
+    a sequence since the last time that same sequence was checked.  If `k` is
+    given, at most `k` of those new elements are tested per call, at a fixed
+    stride.  Only appends are tracked: elements changed in place, or after
+    the sequence has shrunk, are not rechecked.  Up to `maxsize` sequences
+    are remembered at a time.  They are referenced weakly where their type
+    allows it, but sequences such as plain lists are kept alive for as long
+    as they are remembered.
+    """
+
+    # Sequences are spread over several independently locked shards, so that
+    # threads checking different sequences do not contend with each other.
+    # Only the total number of sequences remembered is shared, and it is only
+    # updated when a sequence is seen for the first time.
+    SHARD_BITS = 4
+    SHARDS = 1 << SHARD_BITS
+
+    def __init__(self, predicate, k=None, maxsize=128):
+        assert k is None or (isint(k) and k > 0), "k must be a positive integer"
+        assert isint(maxsize) and maxsize > 0, "maxsize must be a positive integer"
+        self.predicate = predicate
+        self.k = k
+        self.maxsize = maxsize
+        self.size = 0
+        self.sizing = Lock()
+        self.shards = [(Lock(), OrderedDict()) for _ in range(self.SHARDS)]
+
+    def shard(self, key):
+        # Ids are addresses, spaced too regularly to take them modulo SHARDS
+        # directly; the top bits of a Fibonacci hash are spread evenly.
+        return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - self.SHARD_BITS)
+
+    def __call__(self, values):
+        key = id(values)
+        shard = self.shard(key)
+        lock, seen = self.shards[shard]
+        start = 0
+        with lock:
+            if key in seen:
+                previous, start = seen[key]
+                if previous() is values:
+                    seen.move_to_end(key)
+                else:
+                    start = 0
+
+        n = len(values)
+        start = min(start, n)
+        strategy = "incremental"
+        indexes = range(start, n)
+        if self.k is not None and len(indexes) > self.k:
+            strategy = "incremental-stride"
+            indexes = range(start, n, -(-len(indexes) // self.k))
+
+        result = quantify(self.predicate, (values[i] for i in indexes), strategy)
+        if result:
+            with lock:
+                # The reference tells `values` apart from a later sequence
+                # that happens to get the same id.
+                previous = seen.get(key)
+                if previous is None or previous[0]() is not values or previous[1] < n:
+                    seen[key] = (reference_to(values), n)
+            if previous is None:
+                self.added(shard, key)
+        return result
+
+    def added(self, shard, key):
+        """Account for a newly remembered sequence, forgetting one if need be."""
+
+        with self.sizing:
+            self.size += 1
+            if self.size <= self.maxsize:
+                return
+
+        # Forget the least recently checked sequence of the same shard, or of
+        # the next one holding any other than the one just added.  Only one
+        # lock is held at a time.
+        for offset in range(self.SHARDS):
+            lock, seen = self.shards[(shard + offset) % self.SHARDS]
+            with lock:
+                for oldest in seen:
+                    if oldest != key:
+                        del seen[oldest]
+                        break
+                else:
+                    continue
+            break
+        else:
+            return
+
+        with self.sizing:
+            self.size -= 1
+
+def reference_to(value):
+    """Return a weak reference to `value` if possible, or else a strong one."""
+
+    try:
+        return ref(value)
+    except TypeError:
+        return lambda: value
+
 if not __debug__:
-    def require(description, predicate, errno=None):
+    def require(description, predicate, errno=None, budget=None, cost=None, tags=()):
         def func(f):
             return f
         return func
 
-    def ensure(description, predicate, errno=None, clean_up=None):
+    def ensure(description, predicate, errno=None, clean_up=None, budget=None, cost=None, tags=()):
         def func(f):
             return f
         return func
 
-    def invariant(description, predicate):
+    def invariant(description, predicate, budget=None, cost=None, tags=()):
         def func(c):
             return c
         return func